@@ -1,5 +1,8 @@
 import requests
 
+from src.api.replay import replayable
+
+@replayable("get_data")
 def get_data(url):
     response = requests.get(url)
     response.raise_for_status()
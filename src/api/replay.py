@@ -0,0 +1,265 @@
+import asyncio
+import atexit
+import contextlib
+import copy
+import functools
+import gzip
+import inspect
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+# REPLAY_MODE: "off" (default), "record" or "replay"
+# REPLAY_FILE: cassette path (gzip-compressed JSON lines)
+# REPLAY_LATENCY_SCALE: multiplier applied to recorded latencies (0 disables sleeping)
+MODES = ("off", "record", "replay")
+DEFAULT_FILE = "replay/cassette.jsonl.gz"
+# Latency samples kept per key; replay draws from them at random
+MAX_SAMPLES = 100
+
+
+class ReplayedError(Exception):
+    """Raised on replay when the recorded exception type cannot be rebuilt."""
+
+
+class Cassette:
+    """Backend responses and their timings, keyed by operation and call arguments."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.by_op = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    if "latency" in entry:
+                        entry["latencies"] = [entry.pop("latency")]
+                    self._add(entry)
+
+    def save(self):
+        """Write the cassette to a temporary file and move it over the old one."""
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with self.lock:
+            lines = [json.dumps(entry, separators=(",", ":")) + "\n" for entry in self.entries.values()]
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+                f.writelines(lines)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def record(self, op, key, latency, body=None, error=None):
+        """
+        Record one call. body must already be JSON-serializable; error is a
+        {"type", "message"} dict for calls that raised.
+        """
+        entry = {"op": op, "key": key, "latencies": [round(latency, 6)], "body": body}
+        if error is not None:
+            entry["error"] = error
+        with self.lock:
+            self._add(entry)
+
+    def lookup(self, op, key):
+        """
+        Return the recorded entry for (op, key). A synthetic id produced by
+        scaled_ids ("<key>~<n>") resolves to the entry recorded for its base key.
+        Any other key that was never recorded raises KeyError.
+        """
+        entry = self.entries.get((op, key))
+        if entry is not None:
+            return entry
+        base, sep, suffix = key.rpartition("~")
+        if sep and suffix.isdigit():
+            entry = self.entries.get((op, base))
+            if entry is not None:
+                return entry
+        raise KeyError(f"No recorded response for {op!r} with key {key!r}")
+
+    def replay(self, op, key):
+        """
+        Return (latency, body, error) for (op, key). The latency is drawn from the
+        recorded samples. The body is a fresh copy on every call, with occurrences
+        of a synthetic id's base key replaced by the id itself.
+        """
+        entry = self.lookup(op, key)
+        latency = random.choice(entry["latencies"])
+        body = copy.deepcopy(entry["body"])
+        if entry["key"] != key:
+            body = _substitute(body, entry["key"], key)
+        return latency, body, entry.get("error")
+
+    def keys(self, op):
+        return list(self.by_op.get(op, []))
+
+    def _add(self, entry):
+        ident = (entry["op"], entry["key"])
+        existing = self.entries.get(ident)
+        if existing is None:
+            self.by_op.setdefault(entry["op"], []).append(entry["key"])
+            self.entries[ident] = entry
+            return
+        # Keep the latest outcome and accumulate latency samples
+        latencies = (existing["latencies"] + entry["latencies"])[-MAX_SAMPLES:]
+        self.entries[ident] = {**entry, "latencies": latencies}
+
+
+_cassette = None
+
+
+def mode():
+    current = os.environ.get("REPLAY_MODE", "off").lower()
+    if current not in MODES:
+        raise ValueError(f"REPLAY_MODE must be one of {', '.join(MODES)}, got {current!r}")
+    return current
+
+
+def get_cassette():
+    global _cassette
+    if _cassette is None:
+        _cassette = Cassette(os.environ.get("REPLAY_FILE", DEFAULT_FILE))
+        if mode() == "record":
+            atexit.register(_cassette.save)
+    return _cassette
+
+
+def set_cassette(cassette):
+    global _cassette
+    _cassette = cassette
+
+
+def scaled_ids(op, factor):
+    """
+    Expand the recorded customer ids for op into factor times as many
+    distinct ids. Each "<key>~<n>" id replays the response recorded for key,
+    with key replaced by the synthetic id wherever it appears in the body.
+    """
+    ids = get_cassette().keys(op)
+    return [f"{key}~{n}" if n else key for n in range(factor) for key in ids]
+
+
+def _call_key(signature, args, kwargs):
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    if len(bound.arguments) == 1:
+        return str(next(iter(bound.arguments.values())))
+    return json.dumps(bound.arguments, default=str, sort_keys=True)
+
+
+def _substitute(value, old, new):
+    if isinstance(value, str):
+        return new if value == old else value
+    if isinstance(value, list):
+        return [_substitute(item, old, new) for item in value]
+    if isinstance(value, dict):
+        return {k: _substitute(v, old, new) for k, v in value.items()}
+    return value
+
+
+def _to_json(value):
+    """Return a JSON-safe copy of value; values json cannot encode become strings."""
+    if hasattr(value, "model_dump"):
+        value = value.model_dump(mode="json")
+    elif isinstance(value, (list, tuple)):
+        value = [item.model_dump(mode="json") if hasattr(item, "model_dump") else item for item in value]
+    return json.loads(json.dumps(value, default=str))
+
+
+def _delay(latency):
+    return latency * float(os.environ.get("REPLAY_LATENCY_SCALE", "1"))
+
+
+def _rebuild_error(error):
+    module, _, name = error["type"].rpartition(".")
+    cls = getattr(sys.modules.get(module or "builtins"), name, None)
+    if isinstance(cls, type) and issubclass(cls, Exception):
+        try:
+            return cls(error["message"])
+        except Exception:
+            pass
+    return ReplayedError(f"{error['type']}: {error['message']}")
+
+
+def _replayed(op, key):
+    """Return (delay, outcome) for a replayed call; outcome returns the body or raises."""
+    latency, body, error = get_cassette().replay(op, key)
+
+    def outcome(decode):
+        if error is not None:
+            raise _rebuild_error(error)
+        return decode(body)
+
+    return _delay(latency), outcome
+
+
+class _Call:
+    result = None
+
+
+@contextlib.contextmanager
+def _recording(op, key, current):
+    """Time the wrapped call and record its result or exception in record mode."""
+    call = _Call()
+    if current != "record":
+        yield call
+        return
+    start = time.perf_counter()
+    try:
+        yield call
+    except Exception as exc:
+        error = {"type": f"{type(exc).__module__}.{type(exc).__qualname__}", "message": str(exc)}
+        get_cassette().record(op, key, time.perf_counter() - start, error=error)
+        raise
+    get_cassette().record(op, key, time.perf_counter() - start, _to_json(call.result))
+
+
+def replayable(op, decode=None):
+    """
+    Record or replay the return value or exception of a backend call depending
+    on REPLAY_MODE. decode rebuilds the original return type from the recorded JSON body.
+    """
+    decode = decode or (lambda body: body)
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                current = mode()
+                key = _call_key(signature, args, kwargs)
+                if current == "replay":
+                    delay, outcome = _replayed(op, key)
+                    await asyncio.sleep(delay)
+                    return outcome(decode)
+                with _recording(op, key, current) as call:
+                    call.result = await func(*args, **kwargs)
+                return call.result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            current = mode()
+            key = _call_key(signature, args, kwargs)
+            if current == "replay":
+                delay, outcome = _replayed(op, key)
+                time.sleep(delay)
+                return outcome(decode)
+            with _recording(op, key, current) as call:
+                call.result = func(*args, **kwargs)
+            return call.result
+        return wrapper
+
+    return decorator
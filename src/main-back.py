@@ -6,9 +6,14 @@ from pydantic import BaseModel
 from typing import List, Optional
 import requests
 import os
+import sys
 from datetime import datetime
 from pathlib import Path
 
+# Run as a script from src/, so put the repo root on the path for src.* imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.api.replay import replayable
+
 app = FastAPI(title="Customer Context API", version="1.0.0")
 
 # Create static directory for widget files
@@ -82,6 +87,7 @@ async def get_customer_context(customer_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 # Internal data fetching functions
+@replayable("customer_summary", decode=lambda body: CustomerSummary(**body))
 async def fetch_customer_summary(customer_id: str) -> CustomerSummary:
     """
     Fetch customer summary from your systems
@@ -99,6 +105,7 @@ async def fetch_customer_summary(customer_id: str) -> CustomerSummary:
         last_contact="3 days ago"
     )
 
+@replayable("support_history", decode=lambda body: [SupportTicket(**t) for t in body])
 async def fetch_support_history(customer_id: str) -> List[SupportTicket]:
     """
     Fetch support ticket history
@@ -121,6 +128,7 @@ async def fetch_support_history(customer_id: str) -> List[SupportTicket]:
         )
     ]
 
+@replayable("account_info")
 async def fetch_account_info(customer_id: str) -> dict:
     """
     Fetch additional account information
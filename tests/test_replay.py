@@ -0,0 +1,265 @@
+import asyncio
+import gzip
+import os
+from datetime import datetime
+import tempfile
+import unittest
+from unittest import mock
+
+from src.api import replay
+from src.api.replay import Cassette, ReplayedError, replayable
+
+try:
+    from pydantic import BaseModel
+except ImportError:
+    BaseModel = None
+
+class Summary:
+    """Duck-typed stand-in for a pydantic model."""
+
+    def __init__(self, customer_id, risk_score):
+        self.customer_id = customer_id
+        self.risk_score = risk_score
+
+    def model_dump(self, mode="python"):
+        return {"customer_id": self.customer_id, "risk_score": self.risk_score}
+
+    def __eq__(self, other):
+        return isinstance(other, Summary) and self.model_dump() == other.model_dump()
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cassette.jsonl.gz")
+        replay.set_cassette(Cassette(self.path))
+
+    def tearDown(self):
+        replay.set_cassette(None)
+        self.tmp.cleanup()
+
+    def test_record_then_replay(self):
+        calls = []
+
+        @replayable("summary")
+        async def fetch(customer_id):
+            calls.append(customer_id)
+            return {"customer_id": customer_id, "risk_score": "Low"}
+
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "record"}):
+            asyncio.run(fetch("42"))
+        replay.get_cassette().save()
+
+        replay.set_cassette(Cassette(self.path))
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "replay", "REPLAY_LATENCY_SCALE": "0"}):
+            self.assertEqual(asyncio.run(fetch("42")), {"customer_id": "42", "risk_score": "Low"})
+        self.assertEqual(calls, ["42"])
+
+    def test_scaled_ids_replay_recorded_responses(self):
+        @replayable("get_data")
+        def get_data(url):
+            return {"url": url}
+
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "record"}):
+            get_data("a")
+            get_data("b")
+
+        ids = replay.scaled_ids("get_data", 3)
+        self.assertEqual(len(set(ids)), 6)
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "replay", "REPLAY_LATENCY_SCALE": "0"}):
+            for key in ids:
+                self.assertEqual(get_data(key), {"url": key})
+
+    def test_scaled_id_replays_its_base_customer(self):
+        @replayable("summary")
+        def fetch(customer_id):
+            return {"customer_id": customer_id, "tier": customer_id.upper()}
+
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "record"}):
+            fetch("a")
+            fetch("b")
+
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "replay", "REPLAY_LATENCY_SCALE": "0"}):
+            self.assertEqual(fetch("a~5"), {"customer_id": "a~5", "tier": "A"})
+            self.assertEqual(fetch("b~1"), {"customer_id": "b~1", "tier": "B"})
+
+    def test_unrecorded_key_raises(self):
+        @replayable("get_data")
+        def get_data(url):
+            return {"url": url}
+
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "record"}):
+            get_data("https://a/1")
+
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "replay", "REPLAY_LATENCY_SCALE": "0"}):
+            with self.assertRaises(KeyError):
+                get_data("https://totally/other")
+            with self.assertRaises(KeyError):
+                get_data("https://a/2~1")
+
+    def test_keyword_and_positional_calls_share_a_key(self):
+        @replayable("summary")
+        def fetch(customer_id):
+            return {"customer_id": customer_id}
+
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "record"}):
+            fetch("42")
+
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "replay", "REPLAY_LATENCY_SCALE": "0"}):
+            self.assertEqual(fetch(customer_id="42"), {"customer_id": "42"})
+
+    def test_replay_sleeps_for_scaled_latency(self):
+        @replayable("get_data")
+        def get_data(url):
+            return {"url": url}
+
+        @replayable("summary")
+        async def fetch(customer_id):
+            return {"customer_id": customer_id}
+
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "record"}):
+            with mock.patch("src.api.replay.time.perf_counter", side_effect=[10.0, 10.25]):
+                get_data("a")
+            with mock.patch("src.api.replay.time.perf_counter", side_effect=[20.0, 20.5]):
+                asyncio.run(fetch("42"))
+
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "replay", "REPLAY_LATENCY_SCALE": "4"}):
+            with mock.patch("src.api.replay.time.sleep") as sleep:
+                get_data("a")
+            sleep.assert_called_once_with(1.0)
+            with mock.patch("src.api.replay.asyncio.sleep", new=mock.AsyncMock()) as async_sleep:
+                asyncio.run(fetch("42"))
+            async_sleep.assert_awaited_once_with(2.0)
+
+    def test_replayed_and_recorded_objects_are_not_shared(self):
+        @replayable("get_data")
+        def get_data(url):
+            return {"url": url, "items": []}
+
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "record"}):
+            get_data("a")["items"].append("recorded")
+
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "replay", "REPLAY_LATENCY_SCALE": "0"}):
+            first = get_data("a")
+            first["items"].append("replayed")
+            second = get_data("a")
+        self.assertEqual(second, {"url": "a", "items": []})
+        self.assertIsNot(first, second)
+
+    @unittest.skipUnless(BaseModel, "pydantic is not installed")
+    def test_decoded_models_survive_save_and_load(self):
+        class Ticket(BaseModel):
+            date: str
+            status: str
+
+        @replayable("tickets", decode=lambda body: [Ticket(**t) for t in body])
+        async def fetch(customer_id):
+            return [Ticket(date="2025-09-15", status="Resolved")]
+
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "record"}):
+            asyncio.run(fetch("42"))
+        replay.get_cassette().save()
+
+        replay.set_cassette(Cassette(self.path))
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "replay", "REPLAY_LATENCY_SCALE": "0"}):
+            tickets = asyncio.run(fetch("42"))
+        self.assertEqual(tickets, [Ticket(date="2025-09-15", status="Resolved")])
+
+    def test_decode_rebuilds_models_after_save_and_load(self):
+        @replayable("summary", decode=lambda body: Summary(**body))
+        async def fetch(customer_id):
+            return Summary(customer_id, "Low")
+
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "record"}):
+            asyncio.run(fetch("42"))
+        replay.get_cassette().save()
+
+        replay.set_cassette(Cassette(self.path))
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "replay", "REPLAY_LATENCY_SCALE": "0"}):
+            self.assertEqual(asyncio.run(fetch("42")), Summary("42", "Low"))
+            self.assertEqual(asyncio.run(fetch("42~3")), Summary("42~3", "Low"))
+
+    def test_failed_call_is_recorded_and_reraised_after_its_latency(self):
+        class CustomError(Exception):
+            pass
+
+        @replayable("get_data")
+        def get_data(url):
+            if url == "custom":
+                raise CustomError("boom")
+            raise ValueError(f"404 for {url}")
+
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "record"}):
+            with mock.patch("src.api.replay.time.perf_counter", side_effect=[0.0, 3.0]):
+                with self.assertRaises(ValueError):
+                    get_data("a")
+            with self.assertRaises(CustomError):
+                get_data("custom")
+        replay.get_cassette().save()
+
+        replay.set_cassette(Cassette(self.path))
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "replay", "REPLAY_LATENCY_SCALE": "2"}):
+            with mock.patch("src.api.replay.time.sleep") as sleep:
+                with self.assertRaisesRegex(ValueError, "404 for a"):
+                    get_data("a")
+                sleep.assert_called_once_with(6.0)
+                with self.assertRaisesRegex(ReplayedError, "CustomError: boom"):
+                    get_data("custom")
+
+    def test_unserializable_body_is_stored_as_string(self):
+        @replayable("get_data")
+        def get_data(url):
+            return {"at": datetime(2025, 9, 15, 12, 0)}
+
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "record"}):
+            get_data("a")
+        replay.get_cassette().save()
+
+        replay.set_cassette(Cassette(self.path))
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "replay", "REPLAY_LATENCY_SCALE": "0"}):
+            self.assertEqual(get_data("a"), {"at": "2025-09-15 12:00:00"})
+
+    def test_failed_save_keeps_existing_cassette(self):
+        cassette = replay.get_cassette()
+        cassette.record("get_data", "a", 0.1, {"url": "a"})
+        cassette.save()
+        with open(self.path, "rb") as f:
+            saved = f.read()
+
+        cassette.record("get_data", "b", 0.1, {"url": "b"})
+        with mock.patch("src.api.replay.gzip.open", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                cassette.save()
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), saved)
+        self.assertEqual(os.listdir(self.tmp.name), ["cassette.jsonl.gz"])
+
+    def test_reloaded_cassette_keeps_old_and_new_entries(self):
+        replay.get_cassette().record("get_data", "a", 0.1, {"url": "a"})
+        replay.get_cassette().save()
+
+        cassette = Cassette(self.path)
+        cassette.record("get_data", "b", 0.2, {"url": "b"})
+        cassette.record("get_data", "a", 0.3, {"url": "a2"})
+        cassette.save()
+
+        reloaded = Cassette(self.path)
+        self.assertEqual(reloaded.keys("get_data"), ["a", "b"])
+        self.assertEqual(reloaded.lookup("get_data", "a")["latencies"], [0.1, 0.3])
+        self.assertEqual(reloaded.lookup("get_data", "a")["body"], {"url": "a2"})
+
+    def test_old_cassette_format_loads(self):
+        with gzip.open(self.path, "wt", encoding="utf-8") as f:
+            f.write('{"op":"get_data","key":"a","latency":0.5,"body":{"url":"a"}}\n')
+        self.assertEqual(Cassette(self.path).replay("get_data", "a"), (0.5, {"url": "a"}, None))
+
+    def test_unknown_mode_raises(self):
+        @replayable("get_data")
+        def get_data(url):
+            return {"url": url}
+
+        with mock.patch.dict(os.environ, {"REPLAY_MODE": "replya"}):
+            with self.assertRaises(ValueError):
+                get_data("a")
+
+if __name__ == "__main__":
+    unittest.main()